@@ -2,17 +2,81 @@
 
 import streamlit as st
 import numpy as np
-import matplotlib.pyplot as plt
-from sqlalchemy import create_engine
+import pandas as pd
+from sqlalchemy import bindparam, create_engine, select
 from sqlalchemy.orm import sessionmaker
-from database_setup import Method, MethodTechnologyService, Task, Technology
-from math import pi
+from database_setup import Method, MethodTechnologyService, Task, Technology, populate_data
+from simulation import simulate_summary
 
-# Database setup
-engine = create_engine('sqlite:///fuel_cell_database.db')
-Session = sessionmaker(bind=engine)
+# Database setup, the engine and its connection pool are created once per process and shared across reruns
+@st.cache_resource
+def get_engine():
+    return create_engine('sqlite:///fuel_cell_database.db', query_cache_size=1200)
+
+Session = sessionmaker(bind=get_engine())
 session = Session()
 
+# Seed the database with synthetic data once per process, only if it has no scoring data yet
+@st.cache_resource
+def _init_db():
+    with get_engine().connect() as connection:
+        if connection.execute(select(MethodTechnologyService.service_id).limit(1)).first() is None:
+            populate_data()
+
+_init_db()
+
+# Select statements built once at import and executed with bound parameters, so SQLAlchemy reuses
+# their compiled form. They select plain columns, which skips ORM object construction and the identity map
+_METHODS_STMT = select(Method.method_id, Method.name, Method.maturity)
+_TASKS_STMT = select(Task.task_id, Task.task_code)
+_TASK_METHODS_STMT = select(Method.name, Method.method_type).where(Method.task_id == bindparam('task_id'))
+_TECHNOLOGIES_STMT = select(Technology.technology_id, Technology.name)
+_TECHNOLOGY_METHODS_STMT = (
+    select(Method.name)
+    .join(MethodTechnologyService, MethodTechnologyService.method_id == Method.method_id)
+    .where(MethodTechnologyService.technology_id == bindparam('technology_id'))
+    .order_by(MethodTechnologyService.service_id)
+)
+_SVC_STMT = (
+    select(
+        MethodTechnologyService.method_id,
+        MethodTechnologyService.cost_min, MethodTechnologyService.cost_max,
+        MethodTechnologyService.maturity_min, MethodTechnologyService.maturity_max,
+        MethodTechnologyService.integration_min, MethodTechnologyService.integration_max,
+        MethodTechnologyService.interoperability_min, MethodTechnologyService.interoperability_max,
+    )
+    .where(MethodTechnologyService.method_id.in_(bindparam('ids', expanding=True)))
+    .order_by(MethodTechnologyService.service_id)
+)
+
+# Cached database lookups for the UI, returned as plain rows so no ORM objects are kept across reruns
+@st.cache_data
+def load_methods():
+    return session.execute(_METHODS_STMT).all()
+
+@st.cache_data
+def load_tasks_with_methods():
+    tasks = []
+    for task in session.execute(_TASKS_STMT).all():
+        methods = session.execute(_TASK_METHODS_STMT, {'task_id': task.task_id}).all()
+        tasks.append((task.task_code, methods))
+    return tasks
+
+@st.cache_data
+def load_technologies_with_methods():
+    technologies = []
+    for tech in session.execute(_TECHNOLOGIES_STMT).all():
+        methods = session.execute(_TECHNOLOGY_METHODS_STMT, {'technology_id': tech.technology_id}).all()
+        technologies.append((tech.name, methods))
+    return technologies
+
+# Fetch the scoring data of the given methods in a single query, keeping the first service per method
+def load_services(method_ids):
+    services = {}
+    for service in session.execute(_SVC_STMT, {'ids': list(method_ids)}):
+        services.setdefault(service.method_id, service)
+    return services
+
 st.title("Fuel Cell Modeling Monte Carlo Simulation")
 
 # Sidebar to view data from the database
@@ -20,140 +84,132 @@ st.sidebar.header("Database Viewer")
 
 # View methods by task
 if st.sidebar.checkbox("View Methods by Task"):
-    tasks = session.query(Task).all()
-    for task in tasks:
-        st.sidebar.write(f"**Task {task.task_code}**")
-        methods = session.query(Method).filter_by(task_id=task.task_id).all()
+    for task_code, methods in load_tasks_with_methods():
+        st.sidebar.write(f"**Task {task_code}**")
         for method in methods:
             st.sidebar.write(f"- {method.name} ({method.method_type})")
 
 # View methods by technology
 if st.sidebar.checkbox("View Methods by Technology"):
-    technologies = session.query(Technology).all()
-    for tech in technologies:
-        st.sidebar.write(f"**Technology: {tech.name}**")
-        methods = session.query(MethodTechnologyService).filter_by(technology_id=tech.technology_id).all()
-        for method_service in methods:
-            method = session.query(Method).filter_by(method_id=method_service.method_id).first()
-            if method:
-                st.sidebar.write(f"- {method.name}")
+    for tech_name, methods in load_technologies_with_methods():
+        st.sidebar.write(f"**Technology: {tech_name}**")
+        for method in methods:
+            st.sidebar.write(f"- {method.name}")
+
+# Scored parameters, in the row order of the arrays built by build_param_arrays
+PARAMS = ("cost", "maturity", "integration", "interoperability")
 
 # Method selection and individual weight input
 st.header("Select Methods to Bundle")
-methods = session.query(Method).all()
-selected_methods = []
-method_weights = {}
-
-# Display methods as checkboxes
-for method in methods:
-    if st.checkbox(f"{method.name} ({method.maturity})"):
-        selected_methods.append(method)
-        # Individual weight sliders for each selected method
-        cost_w = st.slider(f"Cost Weight for {method.name}", 0.0, 2.0, 1.0, step=0.1)
-        maturity_w = st.slider(f"Maturity Weight for {method.name}", 0.0, 2.0, 1.0, step=0.1)
-        integration_w = st.slider(f"Integration Weight for {method.name}", 0.0, 2.0, 1.0, step=0.1)
-        interoperability_w = st.slider(f"Interoperability Weight for {method.name}", 0.0, 2.0, 1.0, step=0.1)
-        method_weights[method.method_id] = {
-            "cost_w": cost_w,
-            "maturity_w": maturity_w,
-            "integration_w": integration_w,
-            "interoperability_w": interoperability_w,
-        }
-
-# Function to generate random samples from a normal distribution, bounded by min and max
-def sample_normal_dist(min_val, max_val, std_dev=0.5):
-    mean_val = (min_val + max_val) / 2
-    return np.clip(np.random.normal(mean_val, std_dev), min_val, max_val)
+methods = load_methods()
+
+# Select methods with a single multiselect widget
+selected_methods = st.multiselect(
+    "Methods", options=methods, format_func=lambda method: f"{method.name} ({method.maturity})"
+)
+
+# Individual weights of every method in one editable table, indexed by method_id. The table always lists
+# all methods so edits are kept when the selection changes, weights of unselected methods are ignored
+st.subheader("Method Weights")
+weight_columns = [f"{p}_w" for p in PARAMS]
+weights_table = pd.DataFrame(
+    {"method": [method.name for method in methods], **{column: 1.0 for column in weight_columns}},
+    index=pd.Index([method.method_id for method in methods], name="method_id"),
+)
+method_weights = st.data_editor(
+    weights_table,
+    num_rows="fixed",
+    disabled=["method"],
+    column_config={
+        column: st.column_config.NumberColumn(f"{p.capitalize()} Weight", min_value=0.0, max_value=2.0, step=0.1, required=True)
+        for p, column in zip(PARAMS, weight_columns)
+    },
+)
+
+# Convert the bounds and weights of the selected methods into contiguous (n_params, n_methods) float32 arrays,
+# so the simulation never touches ORM objects. Methods without scoring data are skipped
+def build_param_arrays(selected_methods, services, method_weights):
+    selected = [services[method.method_id] for method in selected_methods if method.method_id in services]
+    mins = np.array([[getattr(service, f"{p}_min") for service in selected] for p in PARAMS], dtype=np.float32)
+    maxs = np.array([[getattr(service, f"{p}_max") for service in selected] for p in PARAMS], dtype=np.float32)
+    weights = method_weights.loc[[service.method_id for service in selected], weight_columns].to_numpy(dtype=np.float32).T
+    return mins, maxs, np.ascontiguousarray(weights)
 
 # Monte Carlo Simulation function with additive aggregation and linear weighting
-def monte_carlo_simulation(selected_methods, method_weights, n_simulations=10000):
-    irl_scores = []
-    for _ in range(n_simulations):
-        total_irl = 0
-        for method in selected_methods:
-            service = session.query(MethodTechnologyService).filter_by(method_id=method.method_id).first()
-            if service:
-                # Sample each parameter using a normal distribution within the min/max bounds
-                cost_score = sample_normal_dist(service.cost_min, service.cost_max)
-                maturity_score = sample_normal_dist(service.maturity_min, service.maturity_max)
-                integration_score = sample_normal_dist(service.integration_min, service.integration_max)
-                interoperability_score = sample_normal_dist(service.interoperability_min, service.interoperability_max)
-
-                # Get weights for each parameter
-                weights = method_weights[method.method_id]
-                
-                # Calculate a linearly weighted score for each method
-                weighted_score = (
-                    weights["cost_w"] * cost_score +
-                    weights["maturity_w"] * maturity_score +
-                    weights["integration_w"] * integration_score +
-                    weights["interoperability_w"] * interoperability_score
-                )
-                
-                # Sum scores across all methods in the bundle (additive aggregation)
-                total_irl += weighted_score
-        # Normalize by the total weights and number of methods to keep IRL in range
-        normalization_factor = sum(weights.values()) * len(selected_methods)
-        irl_scores.append(total_irl / normalization_factor)  # Average IRL score
-    return np.array(irl_scores)
+def monte_carlo_simulation(selected_methods, services, method_weights, n_simulations=10000):
+    mins, maxs, weights = build_param_arrays(selected_methods, services, method_weights)
+
+    # Normalize by the sum of all per-method weights to keep IRL in range
+    weights = weights / weights.sum()
+
+    # Sample every parameter within its bounds and summarize the linearly weighted scores across the bundle
+    return simulate_summary(mins, maxs, weights, n_simulations)
+
+# Radar chart categories, in the column order used by radar_values, and their axis angles.
+# The last angle repeats the first one at 2*pi to close the chart
+RADAR_CATEGORIES = ['Maturity', 'Interoperability', 'Integration', 'Cost']
+_ANGLES = np.linspace(0, 2 * np.pi, len(RADAR_CATEGORIES) + 1)
+
+# Average midpoint of each category across the given methods. Cached by the selected method ids,
+# since the radar chart does not depend on the weights
+@st.cache_data
+def radar_values(method_ids):
+    services = load_services(method_ids).values()
+    mins = np.array([(s.maturity_min, s.interoperability_min, s.integration_min, s.cost_min) for s in services])
+    maxs = np.array([(s.maturity_max, s.interoperability_max, s.integration_max, s.cost_max) for s in services])
+    mid_mat = (maxs + mins) / 2
+    return mid_mat.mean(axis=0)
 
 # Function to generate radar chart for the selected methods
-def generate_radar_chart(selected_methods):
-    # Define categories and initialize arrays for parameter averages
-    categories = ['Maturity', 'Interoperability', 'Integration', 'Cost']
-    avg_values = {category: [] for category in categories}
-
-    # Collect scores for each parameter across selected methods
-    for method in selected_methods:
-        service = session.query(MethodTechnologyService).filter_by(method_id=method.method_id).first()
-        if service:
-            avg_values['Maturity'].append((service.maturity_min + service.maturity_max) / 2)
-            avg_values['Interoperability'].append((service.interoperability_min + service.interoperability_max) / 2)
-            avg_values['Integration'].append((service.integration_min + service.integration_max) / 2)
-            avg_values['Cost'].append((service.cost_min + service.cost_max) / 2)
-    
+def generate_radar_chart(method_ids):
     # Compute average values for radar chart
-    values = [np.mean(avg_values[cat]) for cat in categories]
+    values = radar_values(method_ids).tolist()
     values += values[:1]  # Close the radar chart
 
-    # Set up the radar chart
-    num_vars = len(categories)
-    angles = [n / float(num_vars) * 2 * pi for n in range(num_vars)]
-    angles += angles[:1]  # Close the radar chart
+    # Set up the radar chart, using the object-oriented API so the figure is not registered with pyplot.
+    # Matplotlib is imported here so app start-up and reruns without a simulation never load it
+    from matplotlib.figure import Figure
 
-    fig, ax = plt.subplots(figsize=(6, 6), subplot_kw=dict(polar=True))
+    fig = Figure(figsize=(6, 6))
+    ax = fig.add_subplot(polar=True)
 
     # Draw one axe per variable and add labels
-    plt.xticks(angles[:-1], categories, color='grey', size=8)
+    ax.set_xticks(_ANGLES[:-1], RADAR_CATEGORIES, color='grey', size=8)
 
     # Draw y-labels
     ax.set_rlabel_position(0)
-    plt.yticks([2, 4, 6, 8], ["2", "4", "6", "8"], color="grey", size=7)
-    plt.ylim(0, 9)
+    ax.set_yticks([2, 4, 6, 8], ["2", "4", "6", "8"], color="grey", size=7)
+    ax.set_ylim(0, 9)
 
     # Plot data
-    ax.plot(angles, values, linewidth=2, linestyle='solid')
-    ax.fill(angles, values, 'b', alpha=0.1)
+    ax.plot(_ANGLES, values, linewidth=2, linestyle='solid')
+    ax.fill(_ANGLES, values, 'b', alpha=0.1)
 
     # Title and display
-    plt.title('Average Values for Selected Methods', size=14, color='blue', y=1.1)
+    ax.set_title('Average Values for Selected Methods', size=14, color='blue', y=1.1)
     st.pyplot(fig)
 
 # Run simulation and display radar chart on button click
 if st.button("Run Simulation") and selected_methods:
-    scores = monte_carlo_simulation(selected_methods, method_weights)
+    method_ids = tuple(method.method_id for method in selected_methods)
+    services = load_services(method_ids)
+
+    summary = monte_carlo_simulation(selected_methods, services, method_weights)
     
     # Display results
-    st.write("Mean IRL Score:", np.mean(scores))
-    st.write("Standard Deviation:", np.std(scores))
-    percentiles = np.percentile(scores, [5, 50, 95])
+    st.write("Mean IRL Score:", summary.mean)
+    st.write("Standard Deviation:", summary.std)
+    percentiles = summary.percentiles
     st.write(f"5th Percentile: {percentiles[0]}, Median: {percentiles[1]}, 95th Percentile: {percentiles[2]}")
     
-    # Plot results
-    fig, ax = plt.subplots()
-    ax.hist(scores, bins=50, color="skyblue", edgecolor="black")
-    st.pyplot(fig)
+    # Plot results, the histogram is rendered client-side from the binned counts. Bars are labelled by their
+    # bin centre, rounded to two decimals or as many as needed to keep neighbouring labels distinct
+    centres = (summary.edges[:-1] + summary.edges[1:]) / 2
+    width = summary.edges[1] - summary.edges[0]
+    decimals = max(2, int(np.ceil(-np.log10(width)))) if width > 0 else 2
+    histogram = pd.DataFrame({"count": summary.counts}, index=pd.Index(np.round(centres, decimals), name="IRL Score"))
+    st.bar_chart(histogram, color="#87ceeb")
 
     # Generate and display radar chart
     st.header("Radar Chart of Average Values for Selected Methods")
-    generate_radar_chart(selected_methods)
+    generate_radar_chart(method_ids)
@@ -1,6 +1,6 @@
 # File: database_setup.py
 
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, TIMESTAMP
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, ForeignKey, Index, TIMESTAMP
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import datetime
@@ -55,9 +55,28 @@ class MethodTechnologyService(Base):
     integration_min = Column(Float)
     integration_max = Column(Float)
 
+# Indexes on the foreign key columns the app filters and joins on
+mts_method_id_index = Index('ix_mts_method_id', MethodTechnologyService.method_id)
+mts_technology_id_index = Index('ix_mts_technology_id', MethodTechnologyService.technology_id)
+methods_task_id_index = Index('ix_methods_task_id', Method.task_id)
+
 # Create the SQLite database
 engine = create_engine('sqlite:///fuel_cell_database.db')
+
+# Use write-ahead logging so readers are not blocked by writes, and only sync at checkpoints, which is safe with WAL
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
 Base.metadata.create_all(engine)
+
+# create_all skips existing tables together with their indexes, so add them to databases created before them
+for index in (mts_method_id_index, mts_technology_id_index, methods_task_id_index):
+    index.create(engine, checkfirst=True)
+
 Session = sessionmaker(bind=engine)
 session = Session()
 
@@ -68,7 +87,7 @@ def populate_data():
     if not project:
         project = Project(name="DECODE")
         session.add(project)
-        session.commit()
+        session.flush()
     
     # Create tasks
     tasks_data = [
@@ -82,7 +101,7 @@ def populate_data():
         if not task:
             task = Task(**task_data)
             session.add(task)
-            session.commit()
+            session.flush()
         tasks[task_data["task_code"]] = task
     
     # Create PEMFC technology if it doesn't exist
@@ -90,7 +109,7 @@ def populate_data():
     if not technology:
         technology = Technology(name="PEMFC", description="Polymer Electrolyte Membrane Fuel Cell")
         session.add(technology)
-        session.commit()
+        session.flush()
 
     # Create methods for each task
     methods_data = [
@@ -117,10 +136,12 @@ def populate_data():
                 unique_id=f"{method_data['task_code']}-{method_data['name'][:3].upper()}"
             )
             session.add(new_method)
-            session.commit()
     
-    # Populate MethodTechnologyService with synthetic scoring data
+    # Populate MethodTechnologyService with synthetic scoring data for methods that have none yet
+    scored_method_ids = {method_id for (method_id,) in session.query(MethodTechnologyService.method_id).distinct()}
     for method in session.query(Method).all():
+        if method.method_id in scored_method_ids:
+            continue
         service = MethodTechnologyService(
             method_id=method.method_id,
             technology_id=technology.technology_id,
@@ -134,6 +155,9 @@ def populate_data():
             integration_max=random.uniform(7, 9)
         )
         session.add(service)
+
+    # Everything above is written in a single transaction
     session.commit()
 
-populate_data()
+if __name__ == "__main__":
+    populate_data()
@@ -0,0 +1,136 @@
+# File: simulation.py
+
+import math
+from collections import namedtuple
+
+import numpy as np
+
+# Numba is optional, without it the simulation falls back to the vectorized NumPy implementation
+try:
+    import numba
+    from numba import njit, prange
+except ImportError:
+    njit = None
+else:
+    # The parallel kernel is called from Streamlit's per-session script threads. Pin the OpenMP threading
+    # layer, which is safe to call from several threads at once and lets the server shut down cleanly.
+    # workqueue aborts on concurrent calls, and TBB keeps the process from exiting after a run
+    numba.config.THREADING_LAYER = "omp"
+
+# Standard deviation of the normal distribution each parameter is sampled from
+STD_DEV = 0.5
+
+# Random generator shared by all simulations in this process, created once at import
+rng = np.random.default_rng()
+
+# Simulations sampled per chunk, so memory stays bounded however many simulations are run
+CHUNK_SIZE = 100_000
+
+# Fine histogram bins over the possible score range, used for percentiles and merged into the display histogram
+FINE_BINS = 10_000
+
+# Summary of a simulation run, counts and edges describe the display histogram
+SimulationSummary = namedtuple("SimulationSummary", ["mean", "std", "percentiles", "counts", "edges"])
+
+# Vectorized NumPy implementation. All parameters are drawn in a single (n_params, n_simulations, n_methods)
+# float32 call, shifted and clipped in place, and the weighted sum over parameters and methods is fused with einsum
+def numpy_kernel(mins, maxs, weights, n_simulations):
+    n_params, n_methods = mins.shape
+    samples = rng.standard_normal((n_params, n_simulations, n_methods), dtype=np.float32)
+    samples *= np.float32(STD_DEV)
+    samples += ((mins + maxs) / 2)[:, None, :]
+    np.clip(samples, mins[:, None, :], maxs[:, None, :], out=samples)
+    return np.einsum('pnk,pk->n', samples, weights)
+
+if njit is not None:
+    # Bounded sample of one parameter from a standard normal draw z
+    @njit(fastmath=True, cache=True)
+    def _bounded_sample(z, lo, hi):
+        return min(max((lo + hi) * np.float32(0.5) + np.float32(STD_DEV) * z, lo), hi)
+
+    # Compiled kernel, simulations run in parallel and each one keeps a single float32 accumulator,
+    # so no (n_simulations, n_methods) temporaries are allocated. Normal draws come from the Box-Muller
+    # transform, which yields two values per pair of uniforms and has no data-dependent branches
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _parallel_kernel(mins, maxs, weights, n_simulations):
+        n_params, n_methods = mins.shape
+        n_values = n_params * n_methods
+        scores = np.empty(n_simulations, dtype=np.float32)
+        for i in prange(n_simulations):
+            total_irl = np.float32(0.0)
+            for j in range(0, n_values, 2):
+                u1 = np.float32(1.0 - np.random.random())
+                u2 = np.float32(np.random.random())
+                r = math.sqrt(np.float32(-2.0) * math.log(u1))
+                theta = np.float32(2 * math.pi) * u2
+                p, k = divmod(j, n_methods)
+                total_irl += weights[p, k] * _bounded_sample(r * math.cos(theta), mins[p, k], maxs[p, k])
+                if j + 1 < n_values:
+                    p, k = divmod(j + 1, n_methods)
+                    total_irl += weights[p, k] * _bounded_sample(r * math.sin(theta), mins[p, k], maxs[p, k])
+            scores[i] = total_irl
+        return scores
+
+    # Numba raises this ValueError on the first parallel call when the OpenMP runtime cannot be loaded,
+    # e.g. on macOS pip installs. The NumPy implementation is then used for the rest of the process
+    _NO_THREADING_LAYER = "No threading layer could be loaded"
+    _threading_layer_missing = False
+
+    def mc_kernel(mins, maxs, weights, n_simulations):
+        global _threading_layer_missing
+        if not _threading_layer_missing:
+            try:
+                return _parallel_kernel(mins, maxs, weights, n_simulations)
+            except ValueError as error:
+                if _NO_THREADING_LAYER not in str(error):
+                    raise
+                _threading_layer_missing = True
+        return numpy_kernel(mins, maxs, weights, n_simulations)
+else:
+    mc_kernel = numpy_kernel
+
+# Running statistics are (count, mean, sum of squared deviations, fine histogram counts).
+# Two partial results are combined with the parallel form of Welford's update
+def _merge_stats(a, b):
+    n_a, mean_a, m2_a, counts_a = a
+    n_b, mean_b, m2_b, counts_b = b
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    return n, mean_a + delta * n_b / n, m2_a + m2_b + delta ** 2 * n_a * n_b / n, counts_a + counts_b
+
+# Runs the simulations chunk by chunk, keeping only the running statistics of the scores
+def _stream_stats(kernel, mins, maxs, weights, n_simulations, fine_edges):
+    stats = (0, 0.0, 0.0, np.zeros(len(fine_edges) - 1, dtype=np.int64))
+    for start in range(0, n_simulations, CHUNK_SIZE):
+        # Kernels return float32 scores, statistics are accumulated in float64
+        scores = kernel(mins, maxs, weights, min(CHUNK_SIZE, n_simulations - start)).astype(np.float64)
+        np.clip(scores, fine_edges[0], fine_edges[-1], out=scores)
+        counts, _ = np.histogram(scores, fine_edges)
+        mean = scores.mean()
+        stats = _merge_stats(stats, (len(scores), mean, ((scores - mean) ** 2).sum(), counts))
+    return stats
+
+# Runs the Monte Carlo simulation and summarizes the scores without keeping them all in memory.
+# mins, maxs and weights are float32 (n_params, n_methods) arrays. weights must be normalized to sum to one,
+# so every score lies between the weighted averages of the bounds
+def simulate_summary(mins, maxs, weights, n_simulations, percentiles=(5, 50, 95), bins=50):
+    fine_edges = np.linspace((weights * mins).sum(), (weights * maxs).sum(), FINE_BINS + 1, dtype=np.float64)
+    n, mean, m2, fine_counts = _stream_stats(mc_kernel, mins, maxs, weights, n_simulations, fine_edges)
+    width = fine_edges[1] - fine_edges[0]
+
+    # Percentiles, interpolated linearly inside the fine bin where the cumulative count reaches them
+    cdf = np.cumsum(fine_counts)
+    targets = np.asarray(percentiles) / 100 * n
+    idx = np.minimum(np.searchsorted(cdf, targets), FINE_BINS - 1)
+    below = cdf[idx] - fine_counts[idx]
+    percentile_values = fine_edges[idx] + (targets - below) / np.maximum(fine_counts[idx], 1) * width
+
+    # Display histogram, merging equal groups of fine bins over the occupied range into at most `bins` bins
+    occupied = np.flatnonzero(fine_counts)
+    span = fine_counts[occupied[0]:occupied[-1] + 1]
+    per_bin = -(-len(span) // bins)
+    span = np.pad(span, (0, -len(span) % per_bin))
+    counts = span.reshape(-1, per_bin).sum(axis=1)
+    edges = fine_edges[occupied[0]] + np.arange(len(counts) + 1) * per_bin * width
+
+    return SimulationSummary(mean, np.sqrt(m2 / n), percentile_values, counts, edges)